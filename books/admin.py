@@ -4,13 +4,14 @@ from .models import Book, BookLoan
 
 @admin.register(Book)
 class BookAdmin(admin.ModelAdmin):
-    list_display = ("id", "title", "author", "owner")
-    search_fields = ("title", "author", "owner")
+    list_display = ("id", "title", "author", "owner", "current_borrower", "current_due_at")
+    search_fields = ("title", "author", "owner", "current_borrower")
     list_filter = ("owner",)
+    readonly_fields = ("current_borrower", "current_taken_at", "current_due_at")
 
 
 @admin.register(BookLoan)
 class BookLoanAdmin(admin.ModelAdmin):
-    list_display = ("book", "user_email", "taken_at", "returned_at", "is_returned")
-    list_filter = ("returned_at",)
+    list_display = ("book", "user_email", "taken_at", "due_at", "returned_at", "is_returned", "last_reminded_at")
+    list_filter = ("returned_at", "due_at")
     search_fields = ("user_email", "book__title")
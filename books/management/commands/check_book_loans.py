@@ -0,0 +1,84 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.db.models import OuterRef, Subquery
+
+from books.models import NO_CURRENT_LOAN, Book, BookLoan
+
+
+CURRENT_COLUMNS = ("current_loan_id", "current_borrower", "current_taken_at", "current_due_at")
+LOAN_COLUMNS = ("pk", "user_email", "taken_at", "due_at")
+
+
+class Command(BaseCommand):
+    help = (
+        "Verify the denormalized Book.current_* columns against active BookLoan rows "
+        "and optionally repair any book that disagrees."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--repair",
+            action="store_true",
+            help="Rewrite the current_* columns of mismatched books from BookLoan.",
+        )
+        parser.add_argument("--batch-size", type=int, default=2000)
+
+    def handle(self, *args, repair, batch_size, **options):
+        if batch_size < 1:
+            raise CommandError("--batch-size must be a positive integer.")
+
+        active = BookLoan.objects.filter(book=OuterRef("pk"), returned_at__isnull=True)
+        expected = {
+            f"expected_{column}": Subquery(active.values(column)[:1]) for column in LOAN_COLUMNS
+        }
+        rows = (
+            Book.objects.annotate(**expected)
+            .order_by("pk")
+            .values_list("pk", *CURRENT_COLUMNS, *expected)
+            .iterator(chunk_size=batch_size)
+        )
+
+        checked = 0
+        mismatched = []
+        for pk, *values in rows:
+            checked += 1
+            if values[:4] != values[4:]:
+                mismatched.append(pk)
+                self.stdout.write(self.style.WARNING(f"Book {pk}: stored {values[:4]} != active loan {values[4:]}"))
+
+        summary = f"Checked {checked} book(s), {len(mismatched)} inconsistent"
+        if not repair:
+            if mismatched:
+                raise CommandError(f"{summary}. Run with --repair to fix them.")
+            self.stdout.write(self.style.SUCCESS(summary + "."))
+            return
+
+        repaired = sum(self._repair(pk) for pk in mismatched)
+        self.stdout.write(self.style.SUCCESS(f"{summary}, {repaired} repaired."))
+
+    @transaction.atomic
+    def _repair(self, book_id):
+        """
+        Rewrite one book's current_* columns from its active loan. Returns
+        False if a concurrent take/return already made them consistent.
+        """
+        # Lock the Book row first, like the take/return views, then re-read.
+        book = (
+            Book.objects.select_for_update()
+            .filter(pk=book_id)
+            .values_list(*CURRENT_COLUMNS)
+            .first()
+        )
+        if book is None:
+            return False
+        loan = BookLoan.objects.filter(book_id=book_id, returned_at__isnull=True).first()
+        expected = tuple(getattr(loan, column) for column in LOAN_COLUMNS) if loan else (None,) * 4
+        if tuple(book) == expected:
+            return False
+
+        fields = loan.current_fields() if loan else NO_CURRENT_LOAN
+        # Another book may still point at this loan after a bad edit.
+        if loan:
+            Book.objects.filter(current_loan=loan).exclude(pk=book_id).update(**NO_CURRENT_LOAN)
+        Book.objects.filter(pk=book_id).update(**fields)
+        return True
@@ -0,0 +1,125 @@
+import smtplib
+from contextlib import suppress
+from datetime import timedelta
+from itertools import groupby
+from operator import itemgetter
+
+from django.conf import settings
+from django.core import mail
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Q
+from django.utils import timezone
+
+from books.models import BookLoan
+
+
+# Refusals of a single message; the SMTP session itself is still usable.
+MESSAGE_ERRORS = (smtplib.SMTPRecipientsRefused, smtplib.SMTPSenderRefused, smtplib.SMTPDataError)
+
+
+class Command(BaseCommand):
+    help = (
+        "Email every borrower with overdue loans one reminder listing their books. "
+        "Loans reminded within BOOK_OVERDUE_REMINDER_INTERVAL_DAYS are skipped, "
+        "so the command is safe to run repeatedly (e.g. from a daily cron)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=1000,
+            help="Rows fetched per round trip and loans marked as reminded per UPDATE.",
+        )
+        parser.add_argument(
+            "--dry-run",
+            action="store_true",
+            help="Report who would be reminded without sending or recording anything.",
+        )
+
+    def handle(self, *args, batch_size, dry_run, **options):
+        if batch_size < 1:
+            raise CommandError("--batch-size must be a positive integer.")
+        now = timezone.now()
+        interval = timedelta(days=getattr(settings, "BOOK_OVERDUE_REMINDER_INTERVAL_DAYS", 7))
+
+        # One query on the (returned_at, due_at) index, streamed in chunks and
+        # ordered by borrower so each group can be mailed as soon as it ends.
+        rows = (
+            BookLoan.objects.filter(returned_at__isnull=True, due_at__lt=now)
+            .filter(Q(last_reminded_at__isnull=True) | Q(last_reminded_at__lte=now - interval))
+            .order_by("user_email", "id")
+            .values_list("id", "user_email", "due_at", "book__title", "book__author")
+            .iterator(chunk_size=batch_size)
+        )
+
+        borrowers = loans = 0
+        pending_ids = []
+        failed = 0
+
+        def flush():
+            if pending_ids and not dry_run:
+                BookLoan.objects.filter(id__in=pending_ids).update(last_reminded_at=now)
+            pending_ids.clear()
+
+        connection = None if dry_run else mail.get_connection()
+        try:
+            if connection is not None:
+                connection.open()
+            for user_email, group in groupby(rows, key=itemgetter(1)):
+                group = list(group)
+                if connection is not None:
+                    try:
+                        self._send(self._build_message(user_email, group, connection), connection)
+                    except (smtplib.SMTPException, OSError) as exc:
+                        # Leave these loans unmarked so the next run retries them.
+                        failed += 1
+                        self.stderr.write(f"Could not remind {user_email}: {exc}")
+                        continue
+                pending_ids.extend(row[0] for row in group)
+                borrowers += 1
+                loans += len(group)
+                if len(pending_ids) >= batch_size:
+                    flush()
+        finally:
+            # Record whatever was sent even if a later message failed.
+            flush()
+            if connection is not None:
+                connection.close()
+
+        verb = "Would remind" if dry_run else "Reminded"
+        self.stdout.write(self.style.SUCCESS(f"{verb} {borrowers} borrower(s) about {loans} overdue loan(s)."))
+        if failed:
+            raise CommandError(f"Failed to send {failed} reminder(s); they will be retried on the next run.")
+
+    def _send(self, message, connection):
+        try:
+            message.send()
+        except MESSAGE_ERRORS:
+            raise
+        except OSError:
+            # Dropped session (idle timeout, per-session message cap, network
+            # blip). The backend won't reopen a connection it thinks is live,
+            # so reconnect explicitly and retry this message once.
+            with suppress(OSError):
+                connection.close()
+            connection.open()
+            message.send()
+
+    def _build_message(self, user_email, rows, connection):
+        lines = [
+            f"- {title} by {author} (due {timezone.localtime(due_at):%Y-%m-%d})"
+            for _, _, due_at, title, author in rows
+        ]
+        body = (
+            "Hello,\n\n"
+            "The following library books you borrowed are overdue:\n\n"
+            + "\n".join(lines)
+            + "\n\nPlease return them to the company library as soon as possible.\n"
+        )
+        return mail.EmailMessage(
+            subject=f"Overdue library book{'s' if len(rows) > 1 else ''}",
+            body=body,
+            to=[user_email],
+            connection=connection,
+        )
@@ -0,0 +1,44 @@
+# Generated by Django 5.2.7 on 2026-10-19 10:37
+
+import books.models
+from datetime import timedelta
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import F
+
+
+def backfill_due_at(apps, schema_editor):
+    """Existing loans are due one loan period after they were taken."""
+    BookLoan = apps.get_model("books", "BookLoan")
+    days = getattr(settings, "BOOK_LOAN_PERIOD_DAYS", 30)
+    BookLoan.objects.update(due_at=F("taken_at") + timedelta(days=days))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('books', '0004_remove_book_qr_code_book_qr_image'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='bookloan',
+            name='due_at',
+            field=models.DateTimeField(default=books.models.default_due_at),
+        ),
+        migrations.RunPython(backfill_due_at, migrations.RunPython.noop),
+        migrations.AddField(
+            model_name='bookloan',
+            name='last_reminded_at',
+            field=models.DateTimeField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='bookloan',
+            index=models.Index(fields=['returned_at', 'due_at'], name='books_bookl_returne_4ae72a_idx'),
+        ),
+        # Redundant: (returned_at, due_at) has returned_at as its prefix.
+        migrations.RemoveIndex(
+            model_name='bookloan',
+            name='books_bookl_returne_911c4f_idx',
+        ),
+    ]
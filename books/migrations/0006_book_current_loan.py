@@ -0,0 +1,53 @@
+# Generated by Django 5.2.7 on 2026-10-19 10:38
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import OuterRef, Subquery
+
+
+def backfill_current_loan(apps, schema_editor):
+    """Copy each book's active loan onto the new Book.current_* columns."""
+    Book = apps.get_model("books", "Book")
+    BookLoan = apps.get_model("books", "BookLoan")
+    active = BookLoan.objects.filter(book=OuterRef("pk"), returned_at__isnull=True)
+    Book.objects.update(
+        current_loan=Subquery(active.values("pk")[:1]),
+        current_borrower=Subquery(active.values("user_email")[:1]),
+        current_taken_at=Subquery(active.values("taken_at")[:1]),
+        current_due_at=Subquery(active.values("due_at")[:1]),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('books', '0005_bookloan_due_at_last_reminded_at'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='book',
+            name='current_borrower',
+            field=models.EmailField(blank=True, editable=False, max_length=254, null=True),
+        ),
+        migrations.AddField(
+            model_name='book',
+            name='current_due_at',
+            field=models.DateTimeField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='book',
+            name='current_loan',
+            field=models.OneToOneField(blank=True, editable=False, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='books.bookloan'),
+        ),
+        migrations.AddField(
+            model_name='book',
+            name='current_taken_at',
+            field=models.DateTimeField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='book',
+            index=models.Index(fields=['-current_taken_at', 'title'], name='books_book_current_9372a7_idx'),
+        ),
+        migrations.RunPython(backfill_current_loan, migrations.RunPython.noop),
+    ]
@@ -1,10 +1,21 @@
-from django.db import models
+from django.db import models, transaction
 from django.conf import settings
 from django.urls import reverse
+from django.utils import timezone
+from datetime import timedelta
 from io import BytesIO
 import qrcode
 
 
+def default_due_at():
+    """Due date for a loan taken now, per the BOOK_LOAN_PERIOD_DAYS setting."""
+    days = getattr(settings, "BOOK_LOAN_PERIOD_DAYS", 30)
+    return timezone.now() + timedelta(days=days)
+
+
+CURRENT_LOAN_FIELDS = ("current_loan", "current_borrower", "current_taken_at", "current_due_at")
+
+
 class Book(models.Model):
     """
     Represents a book in the company library.
@@ -26,9 +37,40 @@ class Book(models.Model):
     # ✅ QR code stored as binary data inside the DB instead of file
     qr_image = models.BinaryField(blank=True, null=True, editable=False)
 
+    # ✅ Copy of the active loan, so the catalog renders from this table alone.
+    # Maintained by the BookLoan signals; verify with `manage.py check_book_loans`.
+    current_loan = models.OneToOneField(
+        "BookLoan",
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        editable=False,
+        related_name="+",
+    )
+    current_borrower = models.EmailField(blank=True, null=True, editable=False)
+    current_taken_at = models.DateTimeField(blank=True, null=True, editable=False)
+    current_due_at = models.DateTimeField(blank=True, null=True, editable=False)
+
+    class Meta:
+        indexes = [
+            # "Available only" filter and the availability sort in book_list,
+            # which orders by current_taken_at DESC NULLS FIRST, title. A DESC
+            # column is NULLS FIRST by default on PostgreSQL, so they match.
+            models.Index(fields=["-current_taken_at", "title"]),
+        ]
+
     def save(self, *args, **kwargs):
-        """Generate QR code only when a new Book is created."""
+        """
+        Generate QR code only when a new Book is created.
+        Updates never write the current_* columns: those belong to the
+        BookLoan signals, and this instance's copy may be stale.
+        """
         creating = self.pk is None
+        if not self._state.adding and kwargs.get("update_fields") is None:
+            kwargs["update_fields"] = [
+                f.name for f in self._meta.concrete_fields
+                if not f.primary_key and f.name not in CURRENT_LOAN_FIELDS
+            ]
         super().save(*args, **kwargs)  # Save once to get ID
 
         if creating and not self.qr_image:
@@ -40,10 +82,17 @@ class Book(models.Model):
             self.qr_image = buf.getvalue()
             super().save(update_fields=["qr_image"])
 
+    @property
+    def is_overdue(self):
+        return self.current_due_at is not None and self.current_due_at < timezone.now()
+
     def __str__(self):
         return f"{self.title} by {self.author}"
 
 
+NO_CURRENT_LOAN = dict.fromkeys(CURRENT_LOAN_FIELDS)
+
+
 class BookLoan(models.Model):
     """
     Represents an active or completed loan of a book.
@@ -54,6 +103,8 @@ class BookLoan(models.Model):
     user_email = models.EmailField()
     taken_at = models.DateTimeField(auto_now_add=True)
     returned_at = models.DateTimeField(null=True, blank=True)
+    due_at = models.DateTimeField(default=default_due_at)
+    last_reminded_at = models.DateTimeField(null=True, blank=True, editable=False)
 
     class Meta:
         constraints = [
@@ -65,9 +116,28 @@ class BookLoan(models.Model):
         ]
         indexes = [
             models.Index(fields=["book"]),
-            models.Index(fields=["returned_at"]),
+            # Also serves returned_at-only lookups (active loans) as its prefix.
+            # Overdue scan: returned_at IS NULL AND due_at < now
+            models.Index(fields=["returned_at", "due_at"]),
         ]
 
+    def save(self, *args, **kwargs):
+        """
+        Save inside a transaction so the post_save signal that mirrors this
+        loan onto Book.current_* commits or rolls back with the loan row.
+        """
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+
+    def current_fields(self):
+        """Values for the Book.current_* columns while this loan is active."""
+        return {
+            "current_loan": self,
+            "current_borrower": self.user_email,
+            "current_taken_at": self.taken_at,
+            "current_due_at": self.due_at,
+        }
+
     @property
     def is_returned(self):
         return self.returned_at is not None
@@ -0,0 +1,202 @@
+import logging
+import time
+from bisect import bisect_left, insort
+from threading import RLock
+
+from django.conf import settings
+from django.core.cache import cache
+
+
+logger = logging.getLogger(__name__)
+
+
+# ---------------------------------------------------------------------
+# In-memory prefix index for title / author / owner autocomplete
+# ---------------------------------------------------------------------
+
+INDEXED_FIELDS = ("title", "author", "owner")
+
+# Bumped in the shared cache on every committed Book change, so workers
+# other than the one that saved can tell their copy is out of date.
+VERSION_CACHE_KEY = "books:autocomplete_index_version"
+
+
+def _normalize(text):
+    return " ".join(text.split()).casefold()
+
+
+def _keys_for(text):
+    """
+    Every word start of the value is a key, so "tolk" matches
+    "J. R. R. Tolkien" as well as "Tolkien Reader".
+    """
+    words = _normalize(text).split(" ")
+    return {" ".join(words[i:]) for i in range(len(words)) if words[i]}
+
+
+class BookPrefixIndex:
+    """
+    Per-process sorted list of (key, field, value, book_id) tuples.
+
+    Lookups are a bisect to the first key >= prefix followed by a short
+    forward scan, so they never touch the database. The index is built
+    lazily on first use. The Book save/delete signals patch it in the
+    worker that made the change and bump a version counter in the cache;
+    other workers rebuild when they see a newer version. Independently,
+    a copy older than `max_age` seconds is rebuilt, which bounds
+    staleness when CACHES is per-process (the default LocMemCache).
+
+    At most `max_entries` keys are held. Keys beyond the cap are dropped
+    (with a warning logged) and stay unsearchable until the cap is raised
+    and the process restarts or `rebuild()` is called.
+    """
+
+    def __init__(self, max_entries=None, max_age=None):
+        self.max_entries = max_entries
+        self.max_age = max_age
+        self._entries = []
+        self._by_book = {}
+        self._built = False
+        self._built_at = 0.0
+        self._version = None
+        self._lock = RLock()
+
+    def _cap(self):
+        if self.max_entries is not None:
+            return self.max_entries
+        return getattr(settings, "BOOK_AUTOCOMPLETE_MAX_ENTRIES", 50000)
+
+    def _max_age(self):
+        if self.max_age is not None:
+            return self.max_age
+        return getattr(settings, "BOOK_AUTOCOMPLETE_MAX_AGE", 300)
+
+    @staticmethod
+    def _entries_for(book_id, values):
+        for field, value in zip(INDEXED_FIELDS, values):
+            if not value:
+                continue
+            value = " ".join(value.split())
+            for key in sorted(_keys_for(value)):
+                yield (key, field, value, book_id)
+
+    def _warn_cap(self, dropped):
+        logger.warning(
+            "Book autocomplete index is full (%d keys); %d key(s) were not indexed. "
+            "Raise BOOK_AUTOCOMPLETE_MAX_ENTRIES and rebuild to make them searchable.",
+            self._cap(),
+            dropped,
+        )
+
+    def _remove(self, book_id):
+        for entry in self._by_book.pop(book_id, ()):
+            i = bisect_left(self._entries, entry)
+            if i < len(self._entries) and self._entries[i] == entry:
+                del self._entries[i]
+
+    def rebuild(self):
+        """Reload the whole index from the Book table."""
+        from .models import Book
+
+        with self._lock:
+            # Read the version first: a change committed mid-build bumps it
+            # again, so the next lookup rebuilds rather than missing it.
+            version = cache.get(VERSION_CACHE_KEY)
+            cap = self._cap()
+            entries = []
+            rows = Book.objects.order_by("id").values_list("id", *INDEXED_FIELDS).iterator()
+            for book_id, *values in rows:
+                entries.extend(self._entries_for(book_id, values))
+            if len(entries) > cap:
+                self._warn_cap(len(entries) - cap)
+                del entries[cap:]
+            entries.sort()
+
+            by_book = {}
+            for entry in entries:
+                by_book.setdefault(entry[3], []).append(entry)
+            self._entries = entries
+            self._by_book = by_book
+            self._built = True
+            self._built_at = time.monotonic()
+            self._version = version
+
+    def _is_stale(self):
+        if not self._built:
+            return True
+        if time.monotonic() - self._built_at > self._max_age():
+            return True
+        return cache.get(VERSION_CACHE_KEY) != self._version
+
+    def _ensure_fresh(self):
+        with self._lock:
+            # Checked under the lock so concurrent requests rebuild only once.
+            if self._is_stale():
+                self.rebuild()
+
+    def bump_version(self):
+        """
+        Tell every worker that the Book table changed. Called after this
+        worker has applied the change itself, so its own copy stays current
+        unless another worker bumped the version in the meantime.
+        """
+        try:
+            version = cache.incr(VERSION_CACHE_KEY)
+        except ValueError:
+            cache.add(VERSION_CACHE_KEY, 0, timeout=None)
+            version = cache.incr(VERSION_CACHE_KEY)
+        with self._lock:
+            if self._built and version == (self._version or 0) + 1:
+                self._version = version
+
+    def update_book(self, book_id, values):
+        """
+        Replace the entries of a single book. `values` are its title,
+        author and owner, in INDEXED_FIELDS order.
+        """
+        with self._lock:
+            if not self._built:
+                return
+            self._remove(book_id)
+            new = list(self._entries_for(book_id, values))
+            room = max(self._cap() - len(self._entries), 0)
+            if len(new) > room:
+                self._warn_cap(len(new) - room)
+                new = new[:room]
+            for entry in new:
+                insort(self._entries, entry)
+            if new:
+                self._by_book[book_id] = new
+
+    def remove_book(self, book_id):
+        """Drop the entries of a single book."""
+        with self._lock:
+            if self._built:
+                self._remove(book_id)
+
+    def suggest(self, prefix, limit=10):
+        """
+        Return up to `limit` distinct {"value", "field", "book_id"} dicts
+        whose title, author or owner has a word starting with `prefix`.
+        """
+        prefix = _normalize(prefix)
+        if not prefix or limit <= 0:
+            return []
+        self._ensure_fresh()
+
+        with self._lock:
+            results = []
+            seen = set()
+            i = bisect_left(self._entries, (prefix,))
+            while i < len(self._entries) and len(results) < limit:
+                key, field, value, book_id = self._entries[i]
+                if not key.startswith(prefix):
+                    break
+                if (field, value) not in seen:
+                    seen.add((field, value))
+                    results.append({"value": value, "field": field, "book_id": book_id})
+                i += 1
+            return results
+
+
+book_index = BookPrefixIndex()
@@ -0,0 +1,49 @@
+from functools import partial
+
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save, pre_delete
+from django.dispatch import receiver
+
+from .models import NO_CURRENT_LOAN, Book, BookLoan
+from .search_index import INDEXED_FIELDS, book_index
+
+
+@receiver(post_save, sender=Book)
+def index_book_on_save(sender, instance, update_fields=None, **kwargs):
+    """Keep the autocomplete index in step with title/author/owner edits."""
+    if update_fields is not None and not set(update_fields) & set(INDEXED_FIELDS):
+        return  # e.g. the follow-up qr_image save in Book.save()
+    # Only touch the process-wide index once the save is known to stick.
+    values = [getattr(instance, field) for field in INDEXED_FIELDS]
+    transaction.on_commit(partial(book_index.update_book, instance.pk, values))
+    transaction.on_commit(book_index.bump_version)
+
+
+@receiver(post_delete, sender=Book)
+def unindex_book_on_delete(sender, instance, **kwargs):
+    transaction.on_commit(partial(book_index.remove_book, instance.pk))
+    transaction.on_commit(book_index.bump_version)
+
+
+@receiver(post_save, sender=BookLoan)
+def sync_current_loan_on_save(sender, instance, **kwargs):
+    """
+    Mirror the active loan onto Book.current_* columns.
+
+    BookLoan.save() wraps the save and this handler in one transaction, so
+    the loan row and the denormalized columns commit or roll back together.
+    Queryset .update() on BookLoan bypasses it; use check_book_loans --repair.
+    """
+    active = instance.returned_at is None
+    stale = Book.objects.filter(current_loan=instance)
+    if active:
+        stale = stale.exclude(pk=instance.book_id)  # loan moved to another book in admin
+    stale.update(**NO_CURRENT_LOAN)
+    if active:
+        Book.objects.filter(pk=instance.book_id).update(**instance.current_fields())
+
+
+@receiver(pre_delete, sender=BookLoan)
+def clear_current_loan_on_delete(sender, instance, **kwargs):
+    # pre_delete: by post_delete SET_NULL has already cleared current_loan.
+    Book.objects.filter(current_loan=instance).update(**NO_CURRENT_LOAN)
@@ -1,3 +1,413 @@
+import smtplib
+import time
+from datetime import timedelta
+from io import StringIO
+from importlib import import_module
+from unittest import mock
+
+from django.apps import apps as django_apps
+from django.contrib.auth.models import User
+from django.core import mail
+from django.core.cache import cache
+from django.core.mail.backends.locmem import EmailBackend as LocmemEmailBackend
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.db import transaction
+from django.db.models.signals import post_save
 from django.test import TestCase
+from django.urls import reverse
+from django.utils import timezone
+
+from .management.commands.check_book_loans import Command as CheckBookLoansCommand
+from .models import NO_CURRENT_LOAN, Book, BookLoan
+from .search_index import BookPrefixIndex, book_index
+
+
+class BookPrefixIndexTests(TestCase):
+    def setUp(self):
+        self.index = BookPrefixIndex()
+        self.hobbit = Book.objects.create(title="The Hobbit", author="J. R. R. Tolkien", owner="Ann Smith")
+        self.silmarillion = Book.objects.create(title="The Silmarillion", author="J. R. R. Tolkien")
+
+    def test_matches_any_word_start_case_insensitively(self):
+        self.assertEqual(
+            self.index.suggest("HOB"),
+            [{"value": "The Hobbit", "field": "title", "book_id": self.hobbit.id}],
+        )
+        self.assertEqual([r["value"] for r in self.index.suggest("smi")], ["Ann Smith"])
+        self.assertEqual(self.index.suggest("obbit"), [])
+
+    def test_duplicate_values_are_suggested_once(self):
+        self.assertEqual(
+            self.index.suggest("tolk"),
+            [{"value": "J. R. R. Tolkien", "field": "author", "book_id": self.hobbit.id}],
+        )
+
+    def test_limit_and_empty_prefix(self):
+        self.assertEqual(len(self.index.suggest("the", limit=1)), 1)
+        self.assertEqual(self.index.suggest("the", limit=0), [])
+        self.assertEqual(self.index.suggest("   "), [])
+
+    def test_rebuild_over_cap_drops_keys_and_warns(self):
+        index = BookPrefixIndex(max_entries=3)
+        with self.assertLogs("books.search_index", "WARNING"):
+            index.rebuild()
+        self.assertEqual(len(index._entries), 3)
+
+    def test_update_over_cap_drops_keys_and_warns(self):
+        index = BookPrefixIndex(max_entries=14)
+        index.rebuild()
+        with self.assertLogs("books.search_index", "WARNING"):
+            index.update_book(99, ["Dune", "Frank Herbert", None])
+        self.assertEqual(len(index._entries), 14)
+        self.assertEqual(index.suggest("herbert"), [])
+
+
+class BookIndexSignalTests(TestCase):
+    def setUp(self):
+        book_index.rebuild()
+
+    def test_save_and_delete_update_index_on_commit(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            book = Book.objects.create(title="Dune", author="Frank Herbert")
+        self.assertEqual([r["value"] for r in book_index.suggest("dun")], ["Dune"])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            book.title = "Children of Dune"
+            book.save()
+        self.assertEqual([r["value"] for r in book_index.suggest("dun")], ["Children of Dune"])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            book.delete()
+        self.assertEqual(book_index.suggest("dun"), [])
+
+    def test_rolled_back_save_is_not_indexed(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            try:
+                with transaction.atomic():
+                    Book.objects.create(title="Secret Draft", author="Nobody")
+                    raise RuntimeError
+            except RuntimeError:
+                pass
+        self.assertEqual(book_index.suggest("secret"), [])
+
+
+class BookIndexFreshnessTests(TestCase):
+    """Two index instances stand in for two worker processes."""
+
+    def setUp(self):
+        cache.clear()
+        self.book = Book.objects.create(title="Dune", author="Frank Herbert", qr_image=b"png")
+        self.worker_a = BookPrefixIndex()
+        self.worker_b = BookPrefixIndex()
+        self.worker_a.rebuild()
+        self.worker_b.rebuild()
+
+    def _rename_in_worker_a(self, title):
+        Book.objects.filter(pk=self.book.pk).update(title=title)
+        self.worker_a.update_book(self.book.pk, [title, "Frank Herbert", None])
+        self.worker_a.bump_version()
+
+    def test_other_worker_rebuilds_after_version_bump(self):
+        self._rename_in_worker_a("Dune Messiah")
+        self.assertEqual([r["value"] for r in self.worker_b.suggest("mes")], ["Dune Messiah"])
+
+    def test_saving_worker_does_not_rebuild_for_its_own_change(self):
+        self._rename_in_worker_a("Dune Messiah")
+        with mock.patch.object(self.worker_a, "rebuild") as rebuild:
+            self.assertEqual(len(self.worker_a.suggest("mes")), 1)
+        rebuild.assert_not_called()
+
+    def test_copy_older_than_max_age_is_rebuilt(self):
+        Book.objects.filter(pk=self.book.pk).update(title="Dune Messiah")  # no signal, no bump
+        self.assertEqual(self.worker_b.suggest("mes"), [])
+        self.worker_b.max_age = 0
+        time.sleep(0.01)
+        self.assertEqual([r["value"] for r in self.worker_b.suggest("mes")], ["Dune Messiah"])
+
+
+class BookAutocompleteViewTests(TestCase):
+    def setUp(self):
+        user = User.objects.create_user("reader", "reader@example.com", "pw")
+        self.client.force_login(user)
+        for i in range(30):
+            Book.objects.create(title=f"Volume {i:02d}", author="Anon")
+        book_index.rebuild()
+
+    def test_returns_json_suggestions(self):
+        response = self.client.get(reverse("book_autocomplete"), {"q": "volume 0"})
+        self.assertEqual(response.status_code, 200)
+        data = response.json()
+        self.assertEqual(data["q"], "volume 0")
+        self.assertEqual(len(data["results"]), 10)
+        self.assertEqual(data["results"][0]["value"], "Volume 00")
+
+    def test_limit_is_clamped_and_bad_values_fall_back(self):
+        url = reverse("book_autocomplete")
+        self.assertEqual(len(self.client.get(url, {"q": "vol", "limit": 100}).json()["results"]), 25)
+        self.assertEqual(len(self.client.get(url, {"q": "vol", "limit": -5}).json()["results"]), 1)
+        self.assertEqual(len(self.client.get(url, {"q": "vol", "limit": "x"}).json()["results"]), 10)
+
+    def test_requires_login(self):
+        self.client.logout()
+        response = self.client.get(reverse("book_autocomplete"), {"q": "vol"})
+        self.assertEqual(response.status_code, 302)
+
+
+class SendOverdueRemindersTests(TestCase):
+    def setUp(self):
+        now = timezone.now()
+        self.overdue = now - timedelta(days=1)
+        self.ann_loans = [self._loan(f"Ann {i}", "ann@example.com", self.overdue) for i in range(3)]
+        self.bob_loan = self._loan("Bob's book", "bob@example.com", self.overdue)
+        self.not_due = self._loan("Not due", "ann@example.com", now + timedelta(days=3))
+        self.returned = self._loan("Returned", "carl@example.com", self.overdue, returned_at=now)
+
+    def _loan(self, title, email, due_at, returned_at=None):
+        book = Book.objects.create(title=title, author="Someone", qr_image=b"png")
+        return BookLoan.objects.create(book=book, user_email=email, due_at=due_at, returned_at=returned_at)
+
+    def _run(self, *args):
+        call_command("send_overdue_reminders", *args, stdout=StringIO(), stderr=StringIO())
+
+    def test_one_message_per_borrower_listing_their_overdue_books(self):
+        self._run()
+        self.assertEqual(sorted(m.to[0] for m in mail.outbox), ["ann@example.com", "bob@example.com"])
+        ann = next(m for m in mail.outbox if m.to == ["ann@example.com"])
+        for i in range(3):
+            self.assertIn(f"Ann {i} by Someone", ann.body)
+        self.assertNotIn("Not due", ann.body)
+        self.assertNotIn("Returned", "".join(m.body for m in mail.outbox))
+
+    def test_skipped_loans_are_not_marked_reminded(self):
+        self._run()
+        self.not_due.refresh_from_db()
+        self.returned.refresh_from_db()
+        self.assertIsNone(self.not_due.last_reminded_at)
+        self.assertIsNone(self.returned.last_reminded_at)
+
+    def test_second_run_sends_nothing(self):
+        self._run()
+        self._run()
+        self.assertEqual(len(mail.outbox), 2)
+
+    def test_dry_run_sends_and_records_nothing(self):
+        self._run("--dry-run")
+        self.assertEqual(mail.outbox, [])
+        self.assertFalse(BookLoan.objects.filter(last_reminded_at__isnull=False).exists())
+
+    def test_marks_every_loan_across_batches(self):
+        self._run("--batch-size", "1")
+        reminded = BookLoan.objects.filter(last_reminded_at__isnull=False)
+        self.assertEqual(set(reminded), {*self.ann_loans, self.bob_loan})
+
+    def test_failed_recipient_does_not_stop_later_borrowers(self):
+        original = LocmemEmailBackend.send_messages
+
+        def refuse_ann(backend, messages):
+            if messages[0].to == ["ann@example.com"]:
+                raise smtplib.SMTPRecipientsRefused({"ann@example.com": (550, b"no such user")})
+            return original(backend, messages)
+
+        with mock.patch.object(LocmemEmailBackend, "send_messages", refuse_ann):
+            with self.assertRaises(CommandError):
+                self._run()
+
+        self.assertEqual([m.to for m in mail.outbox], [["bob@example.com"]])
+        self.bob_loan.refresh_from_db()
+        self.assertIsNotNone(self.bob_loan.last_reminded_at)
+        self.assertFalse(BookLoan.objects.filter(user_email="ann@example.com", last_reminded_at__isnull=False).exists())
+
+
+    def test_dropped_session_is_reopened_and_message_retried(self):
+        original = LocmemEmailBackend.send_messages
+        calls = []
+
+        def drop_first_send(backend, messages):
+            calls.append(messages[0].to)
+            if len(calls) == 1:
+                raise smtplib.SMTPServerDisconnected("Connection unexpectedly closed")
+            return original(backend, messages)
+
+        with mock.patch.object(LocmemEmailBackend, "send_messages", drop_first_send), \
+                mock.patch.object(LocmemEmailBackend, "open") as reopen:
+            self._run()
+
+        self.assertEqual(calls[0], calls[1])  # same message retried
+        reopen.assert_called()
+        self.assertEqual(sorted(m.to[0] for m in mail.outbox), ["ann@example.com", "bob@example.com"])
+        self.assertEqual(BookLoan.objects.filter(last_reminded_at__isnull=False).count(), 4)
+
+    def test_rejects_non_positive_batch_size(self):
+        for value in ("0", "-1"):
+            with self.assertRaises(CommandError):
+                self._run("--batch-size", value)
+
+class CurrentLoanColumnsTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user("reader", "reader@example.com", "pw")
+        self.client.force_login(self.user)
+        self.book = Book.objects.create(title="Dune", author="Frank Herbert", qr_image=b"png")
+        self.other = Book.objects.create(title="Emma", author="Jane Austen", qr_image=b"png")
+
+    def _take(self, book):
+        self.client.post(reverse("take_book_action", args=[book.id]))
+        return BookLoan.objects.get(book=book, returned_at__isnull=True)
+
+    def test_take_sets_and_return_clears_columns(self):
+        loan = self._take(self.book)
+        self.book.refresh_from_db()
+        self.assertEqual(self.book.current_loan, loan)
+        self.assertEqual(self.book.current_borrower, "reader@example.com")
+        self.assertEqual(self.book.current_taken_at, loan.taken_at)
+        self.assertEqual(self.book.current_due_at, loan.due_at)
+
+        self.client.post(reverse("return_book", args=[self.book.id]))
+        self.book.refresh_from_db()
+        self.assertIsNone(self.book.current_loan)
+        self.assertIsNone(self.book.current_borrower)
+        self.assertIsNone(self.book.current_taken_at)
+        self.assertIsNone(self.book.current_due_at)
+
+    def test_saving_a_stale_book_keeps_current_loan(self):
+        stale = Book.objects.get(pk=self.book.pk)
+        self._take(self.book)
+        stale.title = "Dune (2nd ed.)"
+        stale.save()
+
+        self.book.refresh_from_db()
+        self.assertEqual(self.book.title, "Dune (2nd ed.)")
+        self.assertEqual(self.book.current_borrower, "reader@example.com")
+
+    def test_admin_reassigning_a_loan_moves_the_columns(self):
+        admin = User.objects.create_superuser("admin", "admin@example.com", "pw")
+        self.client.force_login(admin)
+        loan = BookLoan.objects.create(book=self.book, user_email="x@example.com")
+        due = timezone.localtime(loan.due_at)
+        response = self.client.post(
+            reverse("admin:books_bookloan_change", args=[loan.id]),
+            {
+                "book": self.other.id,
+                "user_email": "x@example.com",
+                "returned_at_0": "",
+                "returned_at_1": "",
+                "due_at_0": due.strftime("%Y-%m-%d"),
+                "due_at_1": due.strftime("%H:%M:%S"),
+            },
+        )
+        self.assertEqual(response.status_code, 302)
+        self.book.refresh_from_db()
+        self.other.refresh_from_db()
+        self.assertIsNone(self.book.current_loan)
+        self.assertEqual(self.other.current_loan, loan)
+        self.assertEqual(self.other.current_borrower, "x@example.com")
+
+    def test_deleting_the_active_loan_clears_columns(self):
+        self._take(self.book).delete()
+        self.book.refresh_from_db()
+        self.assertIsNone(self.book.current_loan)
+        self.assertIsNone(self.book.current_borrower)
+
+    def test_available_only_filter(self):
+        self._take(self.book)
+        response = self.client.get(reverse("book_list"), {"available": "1"})
+        self.assertEqual(list(response.context["books"]), [self.other])
+
+    def test_sort_by_availability(self):
+        third = Book.objects.create(title="Anna Karenina", author="Leo Tolstoy", qr_image=b"png")
+        self._take(self.other)
+        with self.assertNumQueries(3):  # session, user, books
+            response = self.client.get(reverse("book_list"), {"sort": "availability"})
+            books = list(response.context["books"])
+        self.assertEqual(books, [third, self.book, self.other])
+        self.assertContains(response, "Taken by reader@example.com")
+
+
+class CheckBookLoansTests(TestCase):
+    def setUp(self):
+        self.book = Book.objects.create(title="Dune", author="Frank Herbert", qr_image=b"png")
+        self.other = Book.objects.create(title="Emma", author="Jane Austen", qr_image=b"png")
+        self.loan = BookLoan.objects.create(book=self.book, user_email="x@example.com")
+
+    def _run(self, *args, out=None):
+        out = out or StringIO()
+        call_command("check_book_loans", *args, stdout=out)
+        return out.getvalue()
+
+    def _corrupt(self):
+        Book.objects.filter(pk=self.book.pk).update(current_loan=None, current_borrower=None)
+        Book.objects.filter(pk=self.other.pk).update(current_borrower="ghost@example.com")
+
+    def test_consistent_columns_pass(self):
+        self.assertIn("Checked 2 book(s), 0 inconsistent.", self._run())
+
+    def test_reports_without_repairing_and_fails(self):
+        self._corrupt()
+        out = StringIO()
+        with self.assertRaisesMessage(CommandError, "2 inconsistent"):
+            self._run(out=out)
+        self.assertIn(f"Book {self.book.pk}:", out.getvalue())
+        self.assertIn(f"Book {self.other.pk}:", out.getvalue())
+        self.book.refresh_from_db()
+        self.assertIsNone(self.book.current_loan)
+
+    def test_repair_restores_columns_from_bookloan(self):
+        self._corrupt()
+        self.assertIn("2 inconsistent, 2 repaired.", self._run("--repair"))
+        self.book.refresh_from_db()
+        self.other.refresh_from_db()
+        self.assertEqual(self.book.current_loan, self.loan)
+        self.assertEqual(self.book.current_borrower, "x@example.com")
+        self.assertIsNone(self.other.current_borrower)
+        self.assertIn("0 inconsistent.", self._run())
+
+    def test_repair_rechecks_under_lock_and_keeps_a_concurrent_take(self):
+        # Flagged while available, then taken before _repair ran: columns
+        # are already right and must not be cleared.
+        command = CheckBookLoansCommand()
+        self.assertFalse(command._repair(self.book.pk))
+        self.book.refresh_from_db()
+        self.assertEqual(self.book.current_loan, self.loan)
+
+    def test_rejects_non_positive_batch_size(self):
+        for value in ("0", "-3"):
+            with self.assertRaises(CommandError):
+                self._run("--batch-size", value)
+
+
+class BookLoanSaveAtomicityTests(TestCase):
+    def test_loan_is_rolled_back_when_syncing_book_fails(self):
+        book = Book.objects.create(title="Dune", author="Frank Herbert", qr_image=b"png")
+
+        def fail(sender, **kwargs):
+            raise RuntimeError("sync failed")
+
+        post_save.connect(fail, sender=BookLoan)
+        try:
+            with self.assertRaises(RuntimeError):
+                BookLoan.objects.create(book=book, user_email="x@example.com")
+        finally:
+            post_save.disconnect(fail, sender=BookLoan)
+        self.assertFalse(BookLoan.objects.exists())
+        book.refresh_from_db()
+        self.assertIsNone(book.current_loan)
+
+
+class BackfillCurrentLoanMigrationTests(TestCase):
+    def test_copies_active_loans_in_one_update(self):
+        migration = import_module("books.migrations.0006_book_current_loan")
+        book = Book.objects.create(title="Dune", author="Frank Herbert", qr_image=b"png")
+        idle = Book.objects.create(title="Emma", author="Jane Austen", qr_image=b"png")
+        BookLoan.objects.create(book=idle, user_email="old@example.com", returned_at=timezone.now())
+        loan = BookLoan.objects.create(book=book, user_email="x@example.com")
+        Book.objects.update(**NO_CURRENT_LOAN)
+
+        with self.assertNumQueries(1):
+            migration.backfill_current_loan(django_apps, None)
 
-# Create your tests here.
+        book.refresh_from_db()
+        idle.refresh_from_db()
+        self.assertEqual(book.current_loan, loan)
+        self.assertEqual(book.current_borrower, "x@example.com")
+        self.assertEqual(book.current_due_at, loan.due_at)
+        self.assertIsNone(idle.current_loan)
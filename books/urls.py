@@ -5,6 +5,7 @@ from . import views
 urlpatterns = [
     # Main pages
     path("", views.book_list, name="book_list"),
+    path("autocomplete/", views.book_autocomplete, name="book_autocomplete"),
     path("take/<int:book_id>/", views.take_book_page, name="take_book_page"),
     path("take/<int:book_id>/reserve/", views.take_book_action, name="take_book_action"),
     path("return/<int:book_id>/", views.return_book, name="return_book"),
@@ -1,16 +1,17 @@
 from django.shortcuts import render, redirect, get_object_or_404
-from django.http import HttpResponse
+from django.http import HttpResponse, JsonResponse
 from django.contrib.auth import login
 from django.contrib.auth.decorators import login_required
 from django.contrib.auth.models import User
 from django.conf import settings
 from django.db import transaction
-from django.db.models import Q
+from django.db.models import F, Q
 from django.utils import timezone
 from django.views.decorators.http import require_POST
 import msal
 
 from .models import Book, BookLoan
+from .search_index import book_index
 
 
 # ---------------------------------------------------------------------
@@ -143,28 +144,50 @@ def book_list(request):
         return redirect("book_list")
 
     q = request.GET.get("q", "").strip()
+    available = request.GET.get("available") == "1"
+    sort = request.GET.get("sort", "")
+
+    # Loan state lives on Book.current_*, so this stays a single-table query.
     books = Book.objects.all()
     if q:
         books = books.filter(
             Q(title__icontains=q) | Q(author__icontains=q) | Q(owner__icontains=q)
         )
-
-    loans = BookLoan.objects.filter(returned_at__isnull=True)
-    loaned_books = {loan.book_id for loan in loans}
-    loan_info = {loan.book_id: loan for loan in loans}
+    if available:
+        books = books.filter(current_taken_at__isnull=True)
+    if sort == "availability":
+        # Matches the (-current_taken_at, title) index: available books
+        # first by title, then the most recently taken ones.
+        books = books.order_by(F("current_taken_at").desc(nulls_first=True), "title")
+    elif sort == "title":
+        books = books.order_by("title")
 
     return render(
         request,
         "books/book_list.html",
         {
             "books": books,
-            "loaned_books": loaned_books,
-            "loan_info": loan_info,
             "q": q,
+            "available": available,
+            "sort": sort,
         },
     )
 
 
+@login_required(login_url="/login/")
+def book_autocomplete(request):
+    """
+    JSON suggestions for the search box, served from the in-memory
+    prefix index (no database query once the index is warm).
+    """
+    q = request.GET.get("q", "").strip()
+    try:
+        limit = min(max(int(request.GET.get("limit", 10)), 1), 25)
+    except ValueError:
+        limit = 10
+    return JsonResponse({"q": q, "results": book_index.suggest(q, limit)})
+
+
 @login_required(login_url="/login/")
 def take_book_page(request, book_id):
     """Show details for taking a specific book (QR target)."""
@@ -177,8 +200,9 @@ def take_book_page(request, book_id):
 @require_POST
 def take_book_action(request, book_id):
     """Reserve a book for the current logged-in user."""
-    book = get_object_or_404(Book, id=book_id)
     with transaction.atomic():
+        # Lock the Book row: the loan signals rewrite its current_* columns.
+        book = get_object_or_404(Book.objects.select_for_update(), id=book_id)
         active_loan = (
             BookLoan.objects.select_for_update()
             .filter(book=book, returned_at__isnull=True)
@@ -203,6 +227,8 @@ def take_book_action(request, book_id):
 def return_book(request, book_id):
     """Mark a book as returned."""
     with transaction.atomic():
+        # Lock the Book row: the loan signals rewrite its current_* columns.
+        Book.objects.select_for_update().filter(id=book_id).first()
         active_loan = (
             BookLoan.objects.select_for_update()
             .filter(book_id=book_id, returned_at__isnull=True)
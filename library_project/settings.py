@@ -182,3 +182,29 @@ SITE_BASE_URL = env(
 LOGIN_URL = "/login/"
 LOGIN_REDIRECT_URL = "/"
 LOGOUT_REDIRECT_URL = "/login/"
+
+# --------------------------------------------------------------------------------------
+# Search autocomplete
+# --------------------------------------------------------------------------------------
+# Upper bound on keys held by the per-process title/author/owner prefix index
+BOOK_AUTOCOMPLETE_MAX_ENTRIES = env.int("BOOK_AUTOCOMPLETE_MAX_ENTRIES", default=50000)
+# Each worker holds its own copy of the index. Book changes bump a version in
+# the default cache so other workers rebuild on their next lookup, but only if
+# CACHES is shared (Redis/Memcached/DB). With the default per-process
+# LocMemCache, other workers can serve suggestions up to this many seconds old.
+BOOK_AUTOCOMPLETE_MAX_AGE = env.int("BOOK_AUTOCOMPLETE_MAX_AGE", default=300)
+
+# --------------------------------------------------------------------------------------
+# Loans & overdue reminders
+# --------------------------------------------------------------------------------------
+BOOK_LOAN_PERIOD_DAYS = env.int("BOOK_LOAN_PERIOD_DAYS", default=30)
+# Minimum gap before the same overdue loan is reminded again
+BOOK_OVERDUE_REMINDER_INTERVAL_DAYS = env.int("BOOK_OVERDUE_REMINDER_INTERVAL_DAYS", default=7)
+
+EMAIL_BACKEND = env("EMAIL_BACKEND", default="django.core.mail.backends.smtp.EmailBackend")
+EMAIL_HOST = env("EMAIL_HOST", default="localhost")
+EMAIL_PORT = env.int("EMAIL_PORT", default=25)
+EMAIL_HOST_USER = env("EMAIL_HOST_USER", default="")
+EMAIL_HOST_PASSWORD = env("EMAIL_HOST_PASSWORD", default="")
+EMAIL_USE_TLS = env.bool("EMAIL_USE_TLS", default=False)
+DEFAULT_FROM_EMAIL = env("DEFAULT_FROM_EMAIL", default="library@localhost")